@@ -1,33 +1,57 @@
+import hashlib
 import os
 import re
 
+from cachetools import TTLCache
+
+from app.batcher import ReplyBatcher
+
 # Optional OpenAI
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
 except Exception:
-    OpenAI = None
+    AsyncOpenAI = None
+
+# Client construction can fail (e.g. incompatible httpx); fall back to rule-based replies
+try:
+    _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") and AsyncOpenAI else None
+except Exception:
+    _client = None
+_model = os.getenv("OPENAI_MODEL", "gpt-5-mini")
+
+_SYSTEM = (
+    "You are a sales assistant for a Pakistani fashion brand. "
+    "Keep replies short, polite, and in simple English. Use only ASCII punctuation."
+)
+
+# Concurrent inbound messages share one completion request
+_batcher = ReplyBatcher(_client, _model, _SYSTEM) if _client else None
+
+_TRANSLATION = str.maketrans({
+    "\u2019": "'",
+    "\u2018": "'",
+    "\u201c": '"',
+    "\u201d": '"',
+    "\u2014": "-",
+    "\u2013": "-",
+})
+_WS_RE = re.compile(r"\s+")
+_STAGE_RE = re.compile(r"price|cost|rate|kitna|suit|order|cod|delivery")
+
+# Repeat inbound texts ("price?") get the same reply without another LLM round trip
+_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
 
 
 def _sanitize_ascii(text: str) -> str:
     if not text:
         return ""
-    # Replace smart quotes/dashes with ascii
-    text = (text
-        .replace("\u2019", "'")
-        .replace("\u2018", "'")
-        .replace("\u201c", '"')
-        .replace("\u201d", '"')
-        .replace("\u2014", "-")
-        .replace("\u2013", "-")
-    )
-    # Remove any remaining non-ascii chars (production safe for WhatsApp basic replies)
-    text = text.encode("ascii", errors="ignore").decode("ascii", errors="ignore")
-    # normalize whitespace
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-
-def run_agent(message_text: str, contact_name: str | None = None) -> tuple[str, str]:
+    # Replace smart quotes/dashes with ascii, then drop any remaining non-ascii
+    # chars (production safe for WhatsApp basic replies) and normalize whitespace
+    text = text.translate(_TRANSLATION).encode("ascii", errors="ignore").decode("ascii")
+    return _WS_RE.sub(" ", text).strip()
+
+
+async def run_agent(message_text: str, contact_name: str | None = None) -> tuple[str, str]:
     """
     Returns: (reply, stage)
     Stage: new|qualified|order|closed
@@ -37,33 +61,25 @@ def run_agent(message_text: str, contact_name: str | None = None) -> tuple[str,
 
     # Fallback rule-based (works without OpenAI)
     stage = "new"
-    if any(k in lower for k in ["price", "cost", "rate", "kitna", "suit", "order", "cod", "delivery"]):
+    if _STAGE_RE.search(lower):
         stage = "qualified"
 
     default_reply = "Share your city + budget and I'll finalize the order."
 
-    api_key = os.getenv("OPENAI_API_KEY")
-    model = os.getenv("OPENAI_MODEL", "gpt-5-mini")
-
-    if not api_key or OpenAI is None:
+    if _batcher is None:
         return (_sanitize_ascii(default_reply), stage)
 
+    key = hashlib.sha256(f"{_model}|{message_text}|{contact_name or ''}".encode("utf-8")).hexdigest()
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        client = OpenAI(api_key=api_key)
-        system = (
-            "You are a sales assistant for a Pakistani fashion brand. "
-            "Keep replies short, polite, and in simple English. Use only ASCII punctuation."
-        )
-        user = f"Customer: {message_text}\nName: {contact_name or ''}\nReply in one line."
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=0.4,
-        )
-        reply = resp.choices[0].message.content or default_reply
-        return (_sanitize_ascii(reply), stage)
+        reply = await _batcher.submit(message_text, contact_name)
+        if not reply:
+            return (_sanitize_ascii(default_reply), stage)
+        result = (_sanitize_ascii(reply), stage)
+        _cache[key] = result
+        return result
     except Exception:
         return (_sanitize_ascii(default_reply), stage)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, List, Optional, Tuple
+
+BATCH_MAX = 16
+BATCH_WAIT_MS = 25
+
+_BATCH_INSTRUCTIONS = (
+    " You will receive a JSON array of customer messages, each with id, text and name."
+    ' Return only a JSON object {"replies": [{"id": <id>, "reply": "<one line reply>"}, ...]}'
+    " with one entry per message."
+)
+
+
+class ReplyBatcher:
+    """
+    Coalesces concurrent reply requests into one chat completion.
+    Requests queued within BATCH_WAIT_MS (up to BATCH_MAX) share a single LLM call.
+    """
+
+    def __init__(self, client: Any, model: str, system: str, max_size: int = BATCH_MAX, wait_ms: int = BATCH_WAIT_MS):
+        self.client = client
+        self.model = model
+        self.system = system + _BATCH_INSTRUCTIONS
+        self.max_size = max_size
+        self.wait = wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set[asyncio.Task] = set()
+
+    async def submit(self, text: str, name: Optional[str] = None) -> str:
+        # Worker is started lazily so it binds to the running event loop
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, name or "", fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.wait
+            while len(batch) < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Dispatch without blocking collection of the next window
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, str, asyncio.Future]]):
+        items = [{"id": i, "text": text, "name": name} for i, (text, name, _) in enumerate(batch)]
+        try:
+            resp = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.system},
+                    {"role": "user", "content": json.dumps(items)},
+                ],
+                temperature=0.4,
+                response_format={"type": "json_object"},
+            )
+            replies = {}
+            for row in json.loads(resp.choices[0].message.content or "{}").get("replies", []):
+                # Models often echo ids back as strings ("0")
+                replies[int(row["id"])] = row.get("reply") or ""
+        except Exception as e:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+
+        for i, (_, _, fut) in enumerate(batch):
+            if not fut.done():
+                fut.set_result(replies.get(i, ""))
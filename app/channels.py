@@ -1,13 +1,23 @@
 from __future__ import annotations
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 GRAPH_BASE = "https://graph.facebook.com"
 
+# One pooled session so replies reuse the keep-alive TLS connection to Graph
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=100,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
 def wa_send_text(phone_number_id: str, access_token: str, to_number: str, text: str):
     url = f"{GRAPH_BASE}/v20.0/{phone_number_id}/messages"
     headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
     payload = {"messaging_product":"whatsapp","to":to_number,"type":"text","text":{"body":text}}
-    r = requests.post(url, headers=headers, json=payload, timeout=20)
+    r = _session.post(url, headers=headers, json=payload, timeout=20)
     r.raise_for_status()
     return r.json()
 
@@ -15,6 +25,6 @@ def graph_send_text(access_token: str, recipient_id: str, text: str):
     url = f"{GRAPH_BASE}/v20.0/me/messages"
     params = {"access_token": access_token}
     payload = {"recipient":{"id":recipient_id},"message":{"text":text}}
-    r = requests.post(url, params=params, json=payload, timeout=20)
+    r = _session.post(url, params=params, json=payload, timeout=20)
     r.raise_for_status()
     return r.json()
@@ -1,27 +1,108 @@
 from __future__ import annotations
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
 from app.config import settings
 
+_IS_SQLITE = settings.database_url.startswith("sqlite")
+_IS_SQLITE_FILE = settings.database_url.startswith("sqlite:///") and ":memory:" not in settings.database_url
+
 # Ensure ./data exists (for sqlite file)
-if settings.database_url.startswith("sqlite:///"):
+if _IS_SQLITE_FILE:
     os.makedirs("data", exist_ok=True)
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {},
-    pool_pre_ping=True,
+
+def _readonly_url(url: str):
+    # sqlite:///./data/x.sqlite -> sqlite:///file:./data/x.sqlite?mode=ro&uri=true
+    if not _IS_SQLITE_FILE:
+        return url
+    u = make_url(url)
+    return u.set(database="file:" + u.database, query={**u.query, "mode": "ro", "uri": "true"})
+
+
+_connect_args = {"check_same_thread": False} if _IS_SQLITE else {}
+
+# SQLite allows a single writer at a time; one pooled connection avoids
+# SQLITE_BUSY between our own writers. Readers get their own pool.
+if _IS_SQLITE_FILE:
+    engine_rw = create_engine(
+        settings.database_url,
+        connect_args=_connect_args,
+        pool_size=1,
+        max_overflow=0,
+        pool_pre_ping=True,
+    )
+    engine_ro = create_engine(
+        _readonly_url(settings.database_url),
+        connect_args=_connect_args,
+        pool_size=(os.cpu_count() or 1) * 2,
+        pool_pre_ping=True,
+    )
+else:
+    engine_rw = create_engine(settings.database_url, connect_args=_connect_args, pool_pre_ping=True)
+    engine_ro = engine_rw
+
+# Backward-compatible name (schema creation, bootstrap)
+engine = engine_rw
+
+# SQLite tuning: WAL lets readers proceed while a writer commits, and
+# synchronous=NORMAL is durable under WAL without an fsync per commit.
+# Do NOT enable cache=shared here (it serializes connections).
+_SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "busy_timeout=5000",
+    "cache_size=-20000",
+    "temp_store=memory",
+    "foreign_keys=ON",
+)
+
+# journal_mode/synchronous cannot be changed on a read-only connection
+_SQLITE_PRAGMAS_RO = (
+    "busy_timeout=5000",
+    "cache_size=-20000",
+    "temp_store=memory",
+    "foreign_keys=ON",
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _pragma_listener(pragmas: tuple[str, ...]):
+    def _sqlite_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        for p in pragmas:
+            cur.execute("PRAGMA " + p)
+        cur.close()
+    return _sqlite_pragmas
+
+
+if _IS_SQLITE:
+    event.listen(engine_rw, "connect", _pragma_listener(_SQLITE_PRAGMAS))
+    if engine_ro is not engine_rw:
+        event.listen(engine_ro, "connect", _pragma_listener(_SQLITE_PRAGMAS_RO))
 
-def get_db():
-    db = SessionLocal()
+SessionRW = sessionmaker(autocommit=False, autoflush=False, bind=engine_rw)
+SessionRO = sessionmaker(autocommit=False, autoflush=False, bind=engine_ro)
+SessionLocal = SessionRW
+
+
+def get_db_rw():
+    db = SessionRW()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_db_ro():
+    db = SessionRO()
     try:
         yield db
     finally:
         db.close()
+
+
+# Backward-compatible alias
+get_db = get_db_rw
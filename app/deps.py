@@ -1,19 +1,63 @@
 from __future__ import annotations
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.db import get_db
+from app.db import get_db_ro
 from app.security import decode_token
 from app.models import User, Tenant
 
 bearer = HTTPBearer(auto_error=False)
 
+class AuthUser(NamedTuple):
+    """Immutable snapshot of an authenticated user, safe to share across threads."""
+    id: int
+    email: str
+    role: str
+    tenant_id: Optional[int]
+    is_active: bool
+
+# Authenticated (active) users keyed by the raw token (its signature makes it unforgeable).
+# Short TTL so role/status changes are picked up within a minute.
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+_user_cache_lock = threading.Lock()  # sync dependencies run in the threadpool
+
+def get_cached_user(token: str) -> Optional[AuthUser]:
+    with _user_cache_lock:
+        hit = _user_cache.get(token)
+    if hit is None:
+        return None
+    user, exp = hit
+    if exp is not None and exp <= time.time():
+        return None
+    return user
+
+def cache_user(token: str, user: User, payload: dict[str, Any]) -> AuthUser:
+    # Callers must only cache users that passed every auth check (incl. is_active)
+    snapshot = AuthUser(
+        id=user.id,
+        email=user.email,
+        role=user.role,
+        tenant_id=user.tenant_id,
+        is_active=user.is_active,
+    )
+    with _user_cache_lock:
+        _user_cache[token] = (snapshot, payload.get("exp"))
+    return snapshot
+
 def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(bearer),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_ro)
 ):
     if not creds:
         raise HTTPException(status_code=401, detail="Missing token")
+    user = get_cached_user(creds.credentials)
+    if user:
+        return user
     try:
         payload = decode_token(creds.credentials)
     except Exception:
@@ -23,14 +67,16 @@ def get_current_user(
     user = db.query(User).filter(User.email == email).first()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    if not user.is_active:
+        raise HTTPException(status_code=403, detail="User disabled")
+    return cache_user(creds.credentials, user, payload)
 
-def require_superadmin(user: User = Depends(get_current_user)):
+def require_superadmin(user: AuthUser = Depends(get_current_user)):
     if user.role != "superadmin":
         raise HTTPException(status_code=403, detail="SuperAdmin only")
     return user
 
-def require_active_tenant(user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def require_active_tenant(user: AuthUser = Depends(get_current_user), db: Session = Depends(get_db_ro)):
     if user.role == "superadmin":
         return user
     if not user.tenant_id:
@@ -1,19 +1,27 @@
 # app/main.py
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import os
 import random
+import re
 import string
 from typing import Optional, Dict, Any, Generator, List
 
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from sqlalchemy import desc, func, insert, inspect, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
-from app.db import get_db, engine
+from app.db import get_db_rw, get_db_ro, engine
 from app.models import Base, Tenant, User, OTP, ChannelAccount, Contact, Deal, Message
 from app.config import settings
 from app.security import (
@@ -22,6 +30,8 @@ from app.security import (
     create_token,
     decode_token,
 )
+from app.otp import hash_otp, verify_otp
+from app.deps import AuthUser, get_cached_user, cache_user
 
 
 # -----------------------------
@@ -37,6 +47,33 @@ def now_utc_naive() -> datetime:
     return datetime.utcnow()
 
 
+def get_user_by_email(db: Session, email: str) -> Optional[User]:
+    return db.query(User).filter(User.email == email).first()
+
+
+def get_latest_unused_otp(db: Session, user_filter, kind: str) -> Optional[OTP]:
+    # Resolve user ids first so the OTP lookup is a range scan on ix_otps_verify
+    user_ids = db.execute(select(User.id).where(user_filter)).scalars().all()
+    if not user_ids:
+        return None
+    return (
+        db.query(OTP)
+        .filter(OTP.user_id.in_(user_ids))
+        .filter(OTP.kind == kind)
+        .filter(OTP.used == False)  # noqa: E712
+        .order_by(desc(OTP.id))
+        .first()
+    )
+
+
+def dialect_insert(db: Session):
+    # INSERT ... ON CONFLICT builder for the bound database (SQLite locally, Postgres in prod)
+    return pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+
+_PRICE_RE = re.compile(r"price|rate")
+
+
 # -----------------------------
 # Schemas
 # -----------------------------
@@ -92,7 +129,7 @@ class TenantRow(BaseModel):
 # -----------------------------
 # Auth Dependency
 # -----------------------------
-def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
+def get_current_user(request: Request, db: Session = Depends(get_db_ro)) -> AuthUser:
     auth = request.headers.get("Authorization", "")
     if not auth.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Missing token")
@@ -100,6 +137,10 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
     if not token:
         raise HTTPException(status_code=401, detail="Missing token")
 
+    user = get_cached_user(token)
+    if user:
+        return user
+
     try:
         payload = decode_token(token)
     except Exception:
@@ -116,10 +157,10 @@ def get_current_user(request: Request, db: Session = Depends(get_db)) -> User:
     if hasattr(user, "is_active") and not user.is_active:
         raise HTTPException(status_code=403, detail="User disabled")
 
-    return user
+    return cache_user(token, user, payload)
 
 
-def require_superadmin(user: User = Depends(get_current_user)) -> User:
+def require_superadmin(user: AuthUser = Depends(get_current_user)) -> AuthUser:
     if user.role != "superadmin":
         raise HTTPException(status_code=403, detail="Forbidden")
     return user
@@ -128,62 +169,95 @@ def require_superadmin(user: User = Depends(get_current_user)) -> User:
 # -----------------------------
 # FastAPI App
 # -----------------------------
-app = FastAPI(title="AI CRM SaaS", version="1.0.0")
-
-
-@app.middleware("http")
-async def force_utf8_json(request: Request, call_next):
+class UTF8ORJSONResponse(ORJSONResponse):
     """
-    Ensures JSON responses have utf-8 charset to avoid mojibake in PowerShell / clients.
+    orjson always emits UTF-8; declaring the charset avoids mojibake in PowerShell / clients.
     """
-    response = await call_next(request)
-
-    ctype = response.headers.get("content-type", "")
-    if "application/json" in ctype and "charset" not in ctype.lower():
-        response.headers["content-type"] = "application/json; charset=utf-8"
-    return response
+    media_type = "application/json; charset=utf-8"
 
 
-@app.on_event("startup")
 def on_startup():
-    # Create DB schema
-    Base.metadata.create_all(bind=engine)
+    # Create DB schema in dev only; other environments create it once at deploy
+    # time so every worker doesn't re-run the table checks against the DB file
+    if settings.APP_ENV == "dev":
+        Base.metadata.create_all(bind=engine)
+    elif not inspect(engine).has_table(User.__tablename__):
+        raise RuntimeError(
+            f"Database schema missing (APP_ENV={settings.APP_ENV}). Create it once with: "
+            'python -c "from app.db import engine; from app.models import Base; '
+            'Base.metadata.create_all(bind=engine)"'
+        )
 
     # Bootstrap superadmin
-    db: Session = next(get_db())
+    db: Session = next(get_db_rw())
     try:
-        su = db.query(User).filter(User.email == settings.SUPERADMIN_EMAIL).first()
-        if not su:
-            su = User(
-                tenant_id=None,
-                email=settings.SUPERADMIN_EMAIL,
-                phone=None,
-                password_hash=hash_password(settings.SUPERADMIN_PASSWORD),
-                role="superadmin",
-                email_verified=True,
-                phone_verified=True,
-                is_active=True,
+        # Existence check only loads the id; bcrypt runs only when the row is missing
+        su_id = db.query(User.id).filter(User.email == settings.SUPERADMIN_EMAIL).scalar()
+        if su_id is None:
+            # ON CONFLICT DO NOTHING: several workers may boot at once
+            result = db.execute(
+                dialect_insert(db)(User)
+                .values(
+                    tenant_id=None,
+                    email=settings.SUPERADMIN_EMAIL,
+                    phone=None,
+                    password_hash=hash_password(settings.SUPERADMIN_PASSWORD),
+                    role="superadmin",
+                    email_verified=True,
+                    phone_verified=True,
+                    is_active=True,
+                )
+                .on_conflict_do_nothing(index_elements=["email"])
             )
-            db.add(su)
             db.commit()
-            print(f"[BOOTSTRAP] SuperAdmin created: {settings.SUPERADMIN_EMAIL}")
+            if result.rowcount:
+                print(f"[BOOTSTRAP] SuperAdmin created: {settings.SUPERADMIN_EMAIL}")
     finally:
         db.close()
 
 
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    on_startup()
+    yield
+
+
+app = FastAPI(
+    title="AI CRM SaaS",
+    version="1.0.0",
+    default_response_class=UTF8ORJSONResponse,
+    lifespan=lifespan,
+)
+
+
+# Error responses use the same utf-8 JSON content type as normal responses
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(_: Request, exc: StarletteHTTPException):
+    return UTF8ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(_: Request, exc: RequestValidationError):
+    return UTF8ORJSONResponse({"detail": jsonable_encoder(exc.errors())}, status_code=422)
+
+
 # -----------------------------
 # Health
 # -----------------------------
+_HEALTH_BODY = b'{"ok":true}'
+
+
 @app.get("/health")
 def health():
-    return {"ok": True}
+    # Pre-encoded body: liveness probes skip response serialization entirely
+    return Response(_HEALTH_BODY, media_type=UTF8ORJSONResponse.media_type)
 
 
 # -----------------------------
 # Auth
 # -----------------------------
 @app.post("/auth/register", response_model=RegisterOut)
-def register(payload: RegisterIn, db: Session = Depends(get_db)):
+def register(payload: RegisterIn, db: Session = Depends(get_db_rw)):
     # basic duplicate checks
     existing = db.query(User).filter(User.email == payload.email).first()
     if existing:
@@ -216,22 +290,25 @@ def register(payload: RegisterIn, db: Session = Depends(get_db)):
 
     expires_at = now_utc_naive() + timedelta(seconds=int(settings.OTP_TTL_SECONDS))
 
-    otp_email = OTP(
-        user_id=user.id,
-        kind="email",
-        code_hash=hash_password(email_code),
-        expires_at=expires_at,
-        used=False,
-    )
-    otp_phone = OTP(
-        user_id=user.id,
-        kind="phone",
-        code_hash=hash_password(phone_code),
-        expires_at=expires_at,
-        used=False,
+    db.execute(
+        insert(OTP),
+        [
+            {
+                "user_id": user.id,
+                "kind": "email",
+                "code_hash": hash_otp(email_code),
+                "expires_at": expires_at,
+                "used": False,
+            },
+            {
+                "user_id": user.id,
+                "kind": "phone",
+                "code_hash": hash_otp(phone_code),
+                "expires_at": expires_at,
+                "used": False,
+            },
+        ],
     )
-
-    db.add_all([otp_email, otp_phone])
     db.commit()
 
     # Mock delivery for dev
@@ -243,24 +320,16 @@ def register(payload: RegisterIn, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/verify-email")
-def verify_email(payload: VerifyEmailIn, db: Session = Depends(get_db)):
-    # Pick latest unused email OTP for the user (join via User)
-    otp = (
-        db.query(OTP)
-        .join(User, User.id == OTP.user_id)
-        .filter(User.email == payload.email)
-        .filter(OTP.kind == "email")
-        .filter(OTP.used == False)  # noqa: E712
-        .order_by(desc(OTP.id))
-        .first()
-    )
+def verify_email(payload: VerifyEmailIn, db: Session = Depends(get_db_rw)):
+    # Pick latest unused email OTP for the user
+    otp = get_latest_unused_otp(db, User.email == payload.email, "email")
     if not otp:
         raise HTTPException(status_code=400, detail="Invalid OTP")
 
     if otp.expires_at < now_utc_naive():
         raise HTTPException(status_code=400, detail="OTP expired")
 
-    if not verify_password(payload.code, otp.code_hash):
+    if not verify_otp(payload.code, otp.code_hash):
         raise HTTPException(status_code=400, detail="Invalid OTP")
 
     otp.used = True
@@ -275,23 +344,15 @@ def verify_email(payload: VerifyEmailIn, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/verify-phone")
-def verify_phone(payload: VerifyPhoneIn, db: Session = Depends(get_db)):
-    otp = (
-        db.query(OTP)
-        .join(User, User.id == OTP.user_id)
-        .filter(User.phone == payload.phone)
-        .filter(OTP.kind == "phone")
-        .filter(OTP.used == False)  # noqa: E712
-        .order_by(desc(OTP.id))
-        .first()
-    )
+def verify_phone(payload: VerifyPhoneIn, db: Session = Depends(get_db_rw)):
+    otp = get_latest_unused_otp(db, User.phone == payload.phone, "phone")
     if not otp:
         raise HTTPException(status_code=400, detail="Invalid OTP")
 
     if otp.expires_at < now_utc_naive():
         raise HTTPException(status_code=400, detail="OTP expired")
 
-    if not verify_password(payload.code, otp.code_hash):
+    if not verify_otp(payload.code, otp.code_hash):
         raise HTTPException(status_code=400, detail="Invalid OTP")
 
     otp.used = True
@@ -306,15 +367,16 @@ def verify_phone(payload: VerifyPhoneIn, db: Session = Depends(get_db)):
 
 
 @app.post("/auth/login", response_model=TokenOut)
-def login(payload: LoginIn, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == payload.email).first()
+async def login(payload: LoginIn, db: Session = Depends(get_db_ro)):
+    # Keep the event loop free: both the DB lookup and bcrypt run in the threadpool
+    user = await run_in_threadpool(get_user_by_email, db, payload.email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     if hasattr(user, "is_active") and not user.is_active:
         raise HTTPException(status_code=403, detail="User disabled")
 
-    if not verify_password(payload.password, user.password_hash):
+    if not await run_in_threadpool(verify_password, payload.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_token(subject=user.email, role=user.role, tenant_id=user.tenant_id)
@@ -325,26 +387,27 @@ def login(payload: LoginIn, db: Session = Depends(get_db)):
 # Admin
 # -----------------------------
 @app.get("/admin/tenants", response_model=List[TenantRow])
-def admin_tenants(_: User = Depends(require_superadmin), db: Session = Depends(get_db)):
-    tenants = db.query(Tenant).order_by(Tenant.id.asc()).all()
-    out = []
-    for t in tenants:
-        out.append(
-            {
-                "id": t.id,
-                "name": t.name,
-                "status": t.status,
-                "created_at": t.created_at.isoformat() if getattr(t, "created_at", None) else "",
-            }
-        )
-    return out
+def admin_tenants(_: AuthUser = Depends(require_superadmin), db: Session = Depends(get_db_ro)):
+    # Plain column rows: no ORM identity map / relationship setup per tenant
+    rows = db.execute(
+        select(Tenant.id, Tenant.name, Tenant.status, Tenant.created_at).order_by(Tenant.id.asc())
+    ).all()
+    return [
+        {
+            "id": r.id,
+            "name": r.name,
+            "status": r.status,
+            "created_at": r.created_at.isoformat() if r.created_at else "",
+        }
+        for r in rows
+    ]
 
 
 # -----------------------------
 # Simulate inbound message (requires auth)
 # -----------------------------
 @app.post("/simulate")
-def simulate(payload: SimulateIn, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def simulate(payload: SimulateIn, user: AuthUser = Depends(get_current_user), db: Session = Depends(get_db_rw)):
     """
     Simulates inbound messages from channels for testing.
     - Requires Bearer token
@@ -358,82 +421,77 @@ def simulate(payload: SimulateIn, user: User = Depends(get_current_user), db: Se
 
     tenant_id = user.tenant_id
 
-    # Find or create contact
-    contact = (
-        db.query(Contact)
-        .filter(Contact.tenant_id == tenant_id)
-        .filter(Contact.channel == payload.channel)
-        .filter(Contact.channel_user_id == payload.channel_user_id)
-        .first()
-    )
-    if not contact:
-        contact = Contact(
+    # One transaction for the whole inbound path: flush where ids are needed, commit once
+    with db.begin():
+        # Upsert contact in one statement (keeps an existing name, fills it if missing)
+        insert_ = dialect_insert(db)
+        stmt = insert_(Contact).values(
             tenant_id=tenant_id,
             channel=payload.channel,
             channel_user_id=payload.channel_user_id,
             contact_name=payload.contact_name,
             phone=payload.channel_user_id if payload.channel == "whatsapp" else None,
         )
-        db.add(contact)
-        db.commit()
-        db.refresh(contact)
-    else:
-        # update name if provided
-        if payload.contact_name and not contact.contact_name:
-            contact.contact_name = payload.contact_name
-            db.commit()
-
-    # Store inbound message
-    msg = Message(
-        tenant_id=tenant_id,
-        contact_id=contact.id,
-        channel=payload.channel,
-        direction="in",
-        text=payload.text,
-    )
-    db.add(msg)
-    db.commit()
-
-    # Find or create deal
-    deal = (
-        db.query(Deal)
-        .filter(Deal.tenant_id == tenant_id)
-        .filter(Deal.contact_id == contact.id)
-        .filter(Deal.status == "open")
-        .order_by(desc(Deal.id))
-        .first()
-    )
-    if not deal:
-        deal = Deal(
-            tenant_id=tenant_id,
-            contact_id=contact.id,
-            stage="new",
-            status="open",
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["tenant_id", "channel", "channel_user_id"],
+            # Same rule as before: only fill a missing/empty name with a non-empty one
+            set_={
+                "contact_name": func.coalesce(
+                    func.nullif(Contact.contact_name, ""),
+                    func.nullif(stmt.excluded.contact_name, ""),
+                )
+            },
+        ).returning(Contact.id)
+        contact_id = db.execute(stmt).scalar_one()
+
+        # Find or create deal
+        deal = (
+            db.query(Deal)
+            .filter(Deal.tenant_id == tenant_id)
+            .filter(Deal.contact_id == contact_id)
+            .filter(Deal.status == "open")
+            .order_by(desc(Deal.id))
+            .first()
+        )
+        if not deal:
+            deal = Deal(
+                tenant_id=tenant_id,
+                contact_id=contact_id,
+                stage="new",
+                status="open",
+            )
+            db.add(deal)
+            db.flush()
+
+        # Simple bot reply + stage
+        text_lower = payload.text.lower()
+        if _PRICE_RE.search(text_lower):
+            reply = "Share your city + budget and I’ll finalize the order."
+            deal.stage = "qualified"
+        else:
+            reply = "Thanks! Share your city + budget so I can guide you."
+            deal.stage = deal.stage or "new"
+        stage = deal.stage
+
+        # Store inbound + outbound messages in one multi-row INSERT
+        db.execute(
+            insert(Message),
+            [
+                {
+                    "tenant_id": tenant_id,
+                    "contact_id": contact_id,
+                    "channel": payload.channel,
+                    "direction": "in",
+                    "text": payload.text,
+                },
+                {
+                    "tenant_id": tenant_id,
+                    "contact_id": contact_id,
+                    "channel": payload.channel,
+                    "direction": "out",
+                    "text": reply,
+                },
+            ],
         )
-        db.add(deal)
-        db.commit()
-        db.refresh(deal)
-
-    # Simple bot reply + stage
-    text_lower = payload.text.lower()
-    if "price" in text_lower or "rate" in text_lower:
-        reply = "Share your city + budget and I’ll finalize the order."
-        deal.stage = "qualified"
-    else:
-        reply = "Thanks! Share your city + budget so I can guide you."
-        deal.stage = deal.stage or "new"
-
-    db.commit()
-
-    # Store outbound message
-    out_msg = Message(
-        tenant_id=tenant_id,
-        contact_id=contact.id,
-        channel=payload.channel,
-        direction="out",
-        text=reply,
-    )
-    db.add(out_msg)
-    db.commit()
 
-    return {"ok": True, "reply": reply, "stage": deal.stage}
+    return {"ok": True, "reply": reply, "stage": stage}
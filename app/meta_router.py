@@ -1,26 +1,24 @@
 from __future__ import annotations
 from typing import Any, Dict, Optional
 
+_CHANNEL_BY_OBJECT = {
+    "whatsapp_business_account": "whatsapp",
+    "page": "messenger",
+    "instagram": "instagram",
+}
+
 def detect_channel(payload: Dict[str, Any]) -> str:
     obj = payload.get("object", "")
-    if obj == "whatsapp_business_account":
-        return "whatsapp"
-    if obj == "page":
-        return "messenger"
-    if obj == "instagram":
-        return "instagram"
-    return "unknown"
+    # Malformed payloads may carry a list/dict here (unhashable)
+    if not isinstance(obj, str):
+        return "unknown"
+    return _CHANNEL_BY_OBJECT.get(obj, "unknown")
 
 def extract_routing_key(payload: Dict[str, Any]) -> Optional[str]:
-    ch = detect_channel(payload)
     try:
-        if ch == "whatsapp":
-            entry = (payload.get("entry") or [])[0]
-            change = (entry.get("changes") or [])[0]
-            value = change.get("value") or {}
-            meta = value.get("metadata") or {}
-            return meta.get("phone_number_id")
-        entry = (payload.get("entry") or [])[0]
+        entry = payload["entry"][0]
+        if detect_channel(payload) == "whatsapp":
+            return entry["changes"][0]["value"]["metadata"].get("phone_number_id")
         return entry.get("id")
-    except Exception:
+    except (KeyError, IndexError, TypeError, AttributeError):
         return None
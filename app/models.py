@@ -71,6 +71,7 @@ class User(Base):
     __table_args__ = (
         UniqueConstraint("email", name="uq_users_email"),
         Index("ix_users_tenant_id", "tenant_id"),
+        Index("ix_users_phone", "phone"),
     )
 
 
@@ -94,7 +95,8 @@ class OTP(Base):
 
     user: Mapped["User"] = relationship(back_populates="otps")
 
-    __table_args__ = (Index("ix_otps_user_kind", "user_id", "kind"),)
+    # verify-email/verify-phone: latest unused OTP per (user, kind); also covers (user_id, kind) lookups
+    __table_args__ = (Index("ix_otps_verify", "user_id", "kind", "used", "id"),)
 
 
 class ChannelAccount(Base):
@@ -1,8 +1,12 @@
 from __future__ import annotations
+import hashlib
+import hmac
 import secrets
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
 
+from app.config import settings
+
 # Use PBKDF2 to avoid bcrypt backend/version issues on Windows.
 pwd = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
@@ -15,6 +19,14 @@ def hash_code(code: str) -> str:
 def verify_code(code: str, hashed: str) -> bool:
     return pwd.verify(code, hashed)
 
+# OTPs are short-lived and single-use, so a keyed HMAC is enough; a slow KDF
+# only burns CPU on every register/verify.
+def hash_otp(code: str) -> str:
+    return hmac.new(settings.JWT_SECRET.encode("utf-8"), code.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def verify_otp(code: str, hashed: str) -> bool:
+    return hmac.compare_digest(hash_otp(code), hashed)
+
 def expires_in(minutes: int):
     return datetime.utcnow() + timedelta(minutes=minutes)
 
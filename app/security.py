@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import functools
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
 
@@ -39,5 +41,16 @@ def create_token(subject: str, role: str, tenant_id: Optional[int]) -> str:
     return create_access_token(subject=subject, role=role, tenant_id=tenant_id)
 
 
-def decode_token(token: str) -> dict[str, Any]:
+@functools.lru_cache(maxsize=4096)
+def _decode_cached(token: str) -> dict[str, Any]:
+    # Only successful decodes are cached; invalid tokens raise every time
     return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
+
+
+def decode_token(token: str) -> dict[str, Any]:
+    payload = _decode_cached(token)
+    # exp was checked when first decoded; re-check it for cache hits
+    exp = payload.get("exp")
+    if exp is not None and int(exp) <= time.time():
+        raise jwt.ExpiredSignatureError("Signature has expired")
+    return dict(payload)